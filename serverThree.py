@@ -1,169 +1,431 @@
-# server.py (with threading)
+# server.py (with asyncio)
 
-import socket
+import asyncio
+import collections
+import datetime
+import functools
+import logging
 import os
-import threading
+import signal
+import socket
+import stat
+import time
 import json # For API responses
+from concurrent.futures import ThreadPoolExecutor
+
+def _json_dumps(obj):
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+# Encode API responses straight to bytes, with orjson (C) when it is installed
+try:
+    import orjson
+
+    def _jdumps(obj):
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson rejects what json accepts (e.g. ints wider than 64 bits)
+            return _json_dumps(obj)
+except ImportError:
+    _jdumps = _json_dumps
 
 HOST = '127.0.0.1'
 PORT = 8080
 STATIC_FILES_DIR = 'static'
+STATIC_ROOT = os.path.realpath(STATIC_FILES_DIR)
+KEEP_ALIVE_TIMEOUT = 5 # Seconds an idle connection is held open between requests (or a body may take to arrive)
+MAX_BODY_SIZE = 1024 * 1024 # Requests with larger bodies are answered with 413 and closed
+MAX_CONNECTIONS = 1024 # Connections beyond this are answered with 503 and closed
+OVERLOAD_READ_TIMEOUT = 1 # Seconds spent reading a rejected request before sending its 503
+FILE_IO_WORKERS = 16 # Threads available for blocking file reads
+WORKERS = int(os.environ.get('WORKERS', os.cpu_count() or 1)) # Server processes sharing the port, one per core by default
+
+# Per-request logging is at DEBUG, so it costs nothing unless enabled (LOGLEVEL=DEBUG)
+log = logging.getLogger('httpd')
 
 # Define common HTTP status codes and their messages
 STATUS_CODES = {
     200: "OK",
     400: "Bad Request",
     404: "Not Found",
-    500: "Internal Server Error"
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable"
 }
 
+# --- Static File Cache ---
+# An LRU of { file_path: (mtime_ns, size, content, content_type) }, revalidated
+# with a single os.stat per request. Only files smaller than SENDFILE_MIN_SIZE
+# are kept in memory; larger ones are streamed from disk with sendfile().
+FILE_CACHE_MAX_ENTRIES = 256
+SENDFILE_MIN_SIZE = 16 * 1024
+_FILE_CACHE = collections.OrderedDict()
+
+# --- Negative Lookup Cache ---
+# { request_path: expiry } for paths that recently 404'd, so repeated probes for
+# missing files skip the filesystem entirely until the entry expires.
+NEG_CACHE_TTL = 5.0 # Seconds
+NEG_CACHE_MAX_ENTRIES = 1024
+_NEG_CACHE = collections.OrderedDict()
+
 # --- Routing System ---
-# A dictionary to store API routes: { (method, path): handler_function }
+# API routes indexed by method, then path: { method: { path: handler_function } }
 ROUTES = {}
 
 def route(method, path):
     def decorator(func):
-        ROUTES[(method.upper(), path)] = func
+        ROUTES.setdefault(method.upper(), {})[path] = func
         return func
     return decorator
 
-# Helper to determine Content-Type based on file extension
+# Content-Type for each served file extension
+MIME_TYPES = {
+    '.html': 'text/html',
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.json': 'application/json',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.txt': 'text/plain'
+}
+
+# Header-ready bytes for each status message and content type
+_STATUS_BYTES = {code: message.encode('ascii') for code, message in STATUS_CODES.items()}
+_MIME_BYTES = {ext: mime_type.encode('ascii') for ext, mime_type in MIME_TYPES.items()}
+
+# Helper to determine Content-Type (as header bytes) based on file extension
 def get_content_type(file_path):
     _, ext = os.path.splitext(file_path)
-    if ext == '.html':
-        return 'text/html'
-    elif ext == '.css':
-        return 'text/css'
-    elif ext == '.js':
-        return 'application/javascript'
-    elif ext == '.json':
-        return 'application/json'
-    elif ext == '.png':
-        return 'image/png'
-    elif ext == '.jpg' or ext == '.jpeg':
-        return 'image/jpeg'
-    elif ext == '.gif':
-        return 'image/gif'
-    elif ext == '.txt':
-        return 'text/plain'
-    else:
-        return 'application/octet-stream' # Default for unknown types
+    return _MIME_BYTES.get(ext.lower(), b'application/octet-stream') # Default for unknown types
 
 def parse_request(request_data):
-    """Parses raw HTTP request data into a dictionary."""
-    lines = request_data.split('\r\n')
+    """Parses raw HTTP request bytes into a dictionary. The body is left as raw bytes."""
+    header_end = request_data.find(b'\r\n\r\n')
+    if header_end == -1:
+        return None # Headers never terminated
+
+    # Header bytes are ASCII; latin-1 decodes any byte without failing
+    lines = request_data[:header_end].decode('latin-1').split('\r\n')
     request_line = lines[0].split(' ')
     if len(request_line) != 3:
         return None # Malformed request line
 
     method, path, http_version = request_line
     headers = {}
-    body_start_index = -1
-    for i, line in enumerate(lines[1:]):
-        if line == '': # Empty line indicates end of headers
-            body_start_index = i + 2 # +2 for request line and header section
-            break
-        if ':' in line:
-            key, value = line.split(':', 1)
+    for line in lines[1:]:
+        key, sep, value = line.partition(':') # One pass per header line
+        if sep:
             headers[key.strip()] = value.strip()
 
-    body = '\r\n'.join(lines[body_start_index:]) if body_start_index != -1 else ''
-
     return {
         'method': method,
         'path': path,
         'http_version': http_version,
         'headers': headers,
-        'body': body
+        'body': request_data[header_end + 4:]
     }
 
-def send_response(conn, status_code, status_message, body, content_type='text/html'):
-    headers = [
-        f"HTTP/1.1 {status_code} {status_message}",
-        f"Content-Type: {content_type}",
-        f"Content-Length: {len(body) if isinstance(body, bytes) else len(body.encode('utf-8'))}",
-        "Connection: close",
-        "\r\n"
-    ]
-    response_headers = "\r\n".join(headers).encode('utf-8')
-
-    conn.sendall(response_headers)
-    if isinstance(body, str):
-        conn.sendall(body.encode('utf-8'))
-    elif isinstance(body, bytes):
-        conn.sendall(body)
-
-def handle_client_connection(conn, addr):
+def is_within_static_root(file_path):
+    real_path = os.path.realpath(file_path)
+    return real_path == STATIC_ROOT or real_path.startswith(STATIC_ROOT + os.sep)
+
+# Request path -> (file_path, index_path): the file it names and the index.html
+# served if that turns out to be a directory. Either is None if it lies outside
+# STATIC_FILES_DIR (e.g. through a symlink). Only the path arithmetic and the
+# realpath checks are cached; whether a path exists or is a directory is
+# stat'ed per request. Symlink changes need a SIGHUP (to the supervisor, when
+# running workers) to clear the cache.
+@functools.lru_cache(maxsize=4096)
+def resolve_static_path(path):
+    file_path = os.path.join(STATIC_FILES_DIR, path.lstrip('/')) # Remove leading slash
+    index_path = os.path.join(file_path, 'index.html')
+    return (file_path if is_within_static_root(file_path) else None,
+            index_path if is_within_static_root(index_path) else None)
+
+def stat_or_none(file_path):
+    if file_path is None:
+        return None
     try:
-        request_data = conn.recv(4096).decode('utf-8')
-        if not request_data:
+        return os.stat(file_path)
+    except OSError:
+        return None
+
+def find_static_file(path):
+    """Returns (file_path, stat_result) for the regular file a request path serves, or (None, None).
+    A plain file costs one stat; a directory serves its index.html for a second one."""
+    file_path, index_path = resolve_static_path(path)
+    st = stat_or_none(file_path)
+    if st is not None and stat.S_ISDIR(st.st_mode): # If path is a directory, serve index.html within it
+        file_path, st = index_path, stat_or_none(index_path)
+    if st is None or not stat.S_ISREG(st.st_mode):
+        return None, None
+    return file_path, st
+
+def is_unsafe_path(path):
+    """Cheap rejection of traversal attempts before any filesystem access."""
+    return '..' in path or '\x00' in path or not path.startswith('/')
+
+def read_file(file_path):
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+def open_file(file_path):
+    """Opens file_path for reading and returns (file, size)."""
+    f = open(file_path, 'rb')
+    try:
+        return f, os.fstat(f.fileno()).st_size
+    except BaseException:
+        f.close()
+        raise
+
+async def load_static_file(file_path, st):
+    """Returns (content, content_type) for a file, reusing the cached copy while its mtime and size are unchanged."""
+    entry = _FILE_CACHE.get(file_path)
+    if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+        _FILE_CACHE.move_to_end(file_path)
+        return entry[2], entry[3]
+
+    # Disk reads block, so run them on the loop's executor
+    # rather than stalling every other connection.
+    loop = asyncio.get_running_loop()
+    content = await loop.run_in_executor(None, read_file, file_path)
+    content_type = get_content_type(file_path)
+
+    _FILE_CACHE[file_path] = (st.st_mtime_ns, st.st_size, content, content_type)
+    _FILE_CACHE.move_to_end(file_path)
+    if len(_FILE_CACHE) > FILE_CACHE_MAX_ENTRIES:
+        _FILE_CACHE.popitem(last=False) # Evict the least recently used file
+    return content, content_type
+
+def remember_missing_path(path):
+    _NEG_CACHE[path] = time.monotonic() + NEG_CACHE_TTL
+    _NEG_CACHE.move_to_end(path)
+    if len(_NEG_CACHE) > NEG_CACHE_MAX_ENTRIES:
+        _NEG_CACHE.popitem(last=False) # Drop the oldest entry
+
+# Every response header block is this one template, filled in by a single bytes % format
+_HEADER_TEMPLATE = (
+    b"HTTP/1.1 %d %b\r\n"
+    b"Content-Type: %b\r\n"
+    b"Content-Length: %d\r\n"
+    b"Connection: %b\r\n" # Whether the client may send another request
+    b"\r\n" # CRLF to separate headers from body
+)
+
+def build_headers(status_code, content_type, content_length, keep_alive=False):
+    connection = b'keep-alive' if keep_alive else b'close'
+    return _HEADER_TEMPLATE % (status_code, _STATUS_BYTES[status_code], content_type, content_length, connection)
+
+def build_response(status_code, body, content_type=b'text/html', keep_alive=False):
+    """Serializes a complete HTTP response (headers and body) to bytes."""
+    body_bytes = body if isinstance(body, bytes) else body.encode('utf-8') # Handle bytes or string
+    return build_headers(status_code, content_type, len(body_bytes), keep_alive) + body_bytes
+
+# Error responses never change, so serialize them once at import time.
+# They all close the connection.
+_RESP_400 = build_response(400, "<h1>400 Malformed Request</h1>")
+_RESP_404 = build_response(404, "<h1>404 Not Found</h1>")
+_RESP_413 = build_response(413, "<h1>413 Payload Too Large</h1>")
+_RESP_500 = build_response(500, "<h1>500 Internal Server Error</h1>")
+_RESP_503 = build_response(503, "<h1>503 Service Unavailable</h1>")
+
+# Bounds how many connections are served at once
+_CONNECTION_SLOTS = asyncio.Semaphore(MAX_CONNECTIONS)
+
+async def send_raw(writer, response):
+    writer.write(response)
+    await writer.drain()
+
+# Responses come in two specializations so the per-call type check disappears:
+# send_bytes is the fast path (file contents and JSON are already bytes), and
+# send_text encodes a str body first.
+async def send_bytes(writer, status_code, body, content_type=b'text/html', keep_alive=False):
+    # Headers and body go out in a single write (one send syscall)
+    await send_raw(writer, build_headers(status_code, content_type, len(body), keep_alive) + body)
+
+async def send_text(writer, status_code, body, content_type=b'text/html', keep_alive=False):
+    await send_bytes(writer, status_code, body.encode('utf-8'), content_type, keep_alive)
+
+async def send_file(writer, file_path, keep_alive=False):
+    """Sends a 200 response whose body is copied from file_path to the socket by the kernel (zero-copy).
+    Returns False if the body failed part way, after which the connection must be closed."""
+    # Opening first means a vanished file raises here, before any header is written.
+    # open() and fstat() can block on disk, so they run on the executor like read_file.
+    loop = asyncio.get_running_loop()
+    f, size = await loop.run_in_executor(None, open_file, file_path)
+    with f:
+        writer.write(build_headers(200, get_content_type(file_path), size, keep_alive))
+        try:
+            await loop.sendfile(writer.transport, f, 0, size)
+        except Exception as e:
+            # The 200 header already promised `size` bytes, so nothing else can follow it
+            log.error("Error sending file %s: %s", file_path, e)
+            return False
+    return True
+
+def get_header(headers, name, default=None):
+    """Looks up a request header by name, ignoring case."""
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return default
+
+def wants_keep_alive(request):
+    """HTTP/1.1 connections persist unless the client sends 'Connection: close'; HTTP/1.0 ones only on 'keep-alive'."""
+    connection = get_header(request['headers'], 'Connection', '').lower()
+    if request['http_version'] == 'HTTP/1.1':
+        return connection != 'close'
+    return connection == 'keep-alive'
+
+async def handle_request(writer, request):
+    """Responds to one parsed request. Returns True if the connection can be reused for another request."""
+    method = request['method']
+    path = request['path']
+    keep_alive = request['keep_alive']
+
+    # --- API Routing ---
+    handler = ROUTES.get(method, {}).get(path)
+    if handler:
+        log.debug("Dispatching to API handler: %s %s", method, path)
+        # Pass the parsed request data to the handler
+        await handler(writer, request)
+        return keep_alive
+
+    # --- Static File Serving (Fallback if no API route matches) ---
+    if method == 'GET':
+        if is_unsafe_path(path):
+            await send_raw(writer, _RESP_400)
+            return False
+
+        if _NEG_CACHE.get(path, 0) > time.monotonic():
+            await send_raw(writer, _RESP_404)
+            return False
+
+        file_path, st = find_static_file(path)
+        if st is not None:
+            try:
+                if st.st_size >= SENDFILE_MIN_SIZE:
+                    if not await send_file(writer, file_path, keep_alive):
+                        return False
+                else:
+                    content, content_type = await load_static_file(file_path, st)
+                    await send_bytes(writer, 200, content, content_type=content_type, keep_alive=keep_alive)
+                return keep_alive
+            except Exception as e:
+                log.error("Error reading file %s: %s", file_path, e)
+                await send_raw(writer, _RESP_500)
+        else:
+            remember_missing_path(path)
+            await send_raw(writer, _RESP_404)
+    else:
+        await send_text(writer, 400, f"<h1>400 Bad Request: Method {method} not supported for static files.</h1>")
+    return False
+
+async def serve_requests(reader, writer, addr):
+    # Serve requests from this connection until the client closes it, asks
+    # for 'Connection: close', or stays idle for KEEP_ALIVE_TIMEOUT seconds.
+    # Pipelined requests simply wait in the reader's buffer.
+    while True:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
             return
 
-        print(f"--- Request from {addr} ---")
-        # print(request_data) # Uncomment to see full raw request
-        print(f"---------------------------\n")
+        log.debug("--- Request from %s ---", addr)
 
-        parsed_request = parse_request(request_data)
+        parsed_request = parse_request(head)
 
         if not parsed_request:
-            send_response(conn, 400, "Bad Request", "<h1>400 Malformed Request</h1>")
+            await send_raw(writer, _RESP_400)
             return
 
-        method = parsed_request['method']
-        path = parsed_request['path']
+        # Only Content-Length framing is supported. A chunked body can't be
+        # skipped safely, so its bytes would be read as the next request.
+        if get_header(parsed_request['headers'], 'Transfer-Encoding') is not None:
+            await send_raw(writer, _RESP_400)
+            return
 
-        # --- API Routing ---
-        handler = ROUTES.get((method, path))
-        if handler:
-            print(f"Dispatching to API handler: {method} {path}")
-            # Pass the parsed request data to the handler
-            handler(conn, parsed_request)
+        content_length = get_header(parsed_request['headers'], 'Content-Length', '0')
+        # isdigit() alone accepts non-ASCII digits such as '²', which int() rejects
+        if not (content_length.isascii() and content_length.isdigit()):
+            await send_raw(writer, _RESP_400)
+            return
+        if int(content_length) > MAX_BODY_SIZE:
+            await send_raw(writer, _RESP_413)
             return
+        try:
+            # A client that stalls mid-body is dropped like an idle one
+            parsed_request['body'] = await asyncio.wait_for(reader.readexactly(int(content_length)), KEEP_ALIVE_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            return
+        parsed_request['keep_alive'] = wants_keep_alive(parsed_request)
 
-        # --- Static File Serving (Fallback if no API route matches) ---
-        if method == 'GET':
-            file_path = os.path.join(STATIC_FILES_DIR, path.lstrip('/'))
-            if os.path.isdir(file_path):
-                file_path = os.path.join(file_path, 'index.html')
-
-            if os.path.exists(file_path) and os.path.isfile(file_path):
-                try:
-                    with open(file_path, 'rb') as f:
-                        content = f.read()
-                    content_type = get_content_type(file_path)
-                    send_response(conn, 200, "OK", content, content_type=content_type)
-                except Exception as e:
-                    print(f"Error reading file {file_path}: {e}")
-                    send_response(conn, 500, "Internal Server Error", "<h1>500 Internal Server Error</h1>")
-            else:
-                send_response(conn, 404, "Not Found", "<h1>404 Not Found</h1>")
-        else:
-            send_response(conn, 400, "Bad Request", f"<h1>400 Bad Request: Method {method} not supported for static files.</h1>")
+        if not await handle_request(writer, parsed_request):
+            return
 
+async def handle_client_connection(reader, writer):
+    addr = writer.get_extra_info('peername')
+    try:
+        if _CONNECTION_SLOTS.locked():
+            # Shed load rather than let latency grow without bound
+            log.debug("Rejecting %s: %d connections already open", addr, MAX_CONNECTIONS)
+            # Consume the request head first: closing with unread data makes the
+            # kernel send an RST, and the client would see a reset, not the 503
+            try:
+                await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), OVERLOAD_READ_TIMEOUT)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+                pass
+            await send_raw(writer, _RESP_503)
+            writer.write_eof()
+            return
+
+        async with _CONNECTION_SLOTS:
+            await serve_requests(reader, writer, addr)
+
+    except ConnectionError as e:
+        # The client reset or hung up mid-response; there is nobody to send a 500 to
+        log.debug("Connection from %s lost: %s", addr, e)
     except Exception as e:
-        print(f"Error handling request from {addr}: {e}")
-        send_response(conn, 500, "Internal Server Error", "<h1>500 Internal Server Error</h1>")
+        log.error("Error handling request from %s: %s", addr, e)
+        await send_raw(writer, _RESP_500)
     finally:
-        conn.close() # Ensure connection is closed
+        writer.close() # Ensure connection is closed
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
 
 # --- Define API Endpoints ---
 @route('GET', '/api/hello')
-def hello_api(conn, request):
+async def hello_api(writer, request):
     name = request['headers'].get('X-Name', 'World') # Example of reading a custom header
-    response_data = {"message": f"Hello, {name} from API!", "timestamp": threading.current_thread().name}
-    send_response(conn, 200, "OK", json.dumps(response_data), content_type='application/json')
+    response_data = {"message": f"Hello, {name} from API!", "timestamp": asyncio.current_task().get_name()}
+    await send_bytes(writer, 200, _jdumps(response_data), content_type=b'application/json', keep_alive=request['keep_alive'])
+
+# The formatted time only changes once a second, so reuse it within that second
+_fromtimestamp = datetime.datetime.fromtimestamp
+_last_time = (None, '')
+
+def format_current_time():
+    global _last_time
+    second = int(time.time())
+    if _last_time[0] != second:
+        _last_time = (second, _fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S"))
+    return _last_time[1]
 
 @route('GET', '/api/time')
-def get_time_api(conn, request):
-    import datetime
-    current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    response_data = {"current_time": current_time, "thread_name": threading.current_thread().name}
-    send_response(conn, 200, "OK", json.dumps(response_data), content_type='application/json')
+async def get_time_api(writer, request):
+    current_time = format_current_time()
+    response_data = {"current_time": current_time, "thread_name": asyncio.current_task().get_name()}
+    await send_bytes(writer, 200, _jdumps(response_data), content_type=b'application/json', keep_alive=request['keep_alive'])
 
 @route('POST', '/api/echo')
-def echo_api(conn, request):
+async def echo_api(writer, request):
     try:
-        request_body = request['body']
+        request_body = request['body'].decode('utf-8')
         # Try to parse as JSON, otherwise treat as plain text
         try:
             data = json.loads(request_body)
@@ -171,31 +433,90 @@ def echo_api(conn, request):
             data = {"received_raw_body": request_body}
 
         response_data = {"status": "success", "echo": data, "method": request['method']}
-        send_response(conn, 200, "OK", json.dumps(response_data), content_type='application/json')
+        # Client JSON can hold NaN/Infinity, which orjson silently turns into null,
+        # so echoes always use the json encoder
+        await send_bytes(writer, 200, _json_dumps(response_data), content_type=b'application/json', keep_alive=request['keep_alive'])
     except Exception as e:
-        send_response(conn, 400, "Bad Request", json.dumps({"error": str(e)}), content_type='application/json')
-
-def run_server():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind((HOST, PORT))
-        print(f"Server listening on {HOST}:{PORT}")
-        s.listen(5)
-
-        while True:
-            conn, addr = s.accept()
-            # Create a new thread for each client connection
-            client_thread = threading.Thread(
-                target=handle_client_connection,
-                args=(conn, addr),
-                name=f"ClientHandler-{addr[1]}" # Name the thread for debugging
-            )
-            client_thread.start() # Start the thread
-            # conn.close() # Important: Do NOT close the connection here in the main thread.
-                         # The thread needs to manage its own connection.
+        await send_bytes(writer, 400, _jdumps({"error": str(e)}), content_type=b'application/json', keep_alive=request['keep_alive'])
+
+def supervise_workers():
+    """Forks WORKERS server processes. Each one binds its own SO_REUSEPORT socket,
+    so the kernel spreads connections across processes (and cores) instead of one
+    interpreter's GIL serializing them. Must run before any event loop starts.
+
+    In a worker this returns the supervisor's pid. The supervisor itself stays
+    here: it forwards SIGTERM/SIGINT (as SIGTERM) and SIGHUP to the workers,
+    reaps them as they exit, and returns None once they are all gone."""
+    supervisor_pid = os.getpid()
+    workers = set()
+    for _ in range(WORKERS):
+        pid = os.fork()
+        if pid == 0:
+            # Ctrl-C reaches the whole process group; let the supervisor's SIGTERM
+            # be the one shutdown path
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            return supervisor_pid
+        workers.add(pid)
+
+    def signal_workers(signum):
+        for pid in workers:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass # Already exited, not reaped yet
+
+    def stop_workers(signum, frame):
+        signal_workers(signal.SIGTERM)
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, stop_workers)
+    # Each worker has its own path cache, so a SIGHUP to the supervisor clears them all
+    signal.signal(signal.SIGHUP, lambda signum, frame: signal_workers(signal.SIGHUP))
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        log.warning("Worker %d exited with code %d", pid, os.waitstatus_to_exitcode(status))
+    return None
+
+async def exit_with_supervisor(server, supervisor_pid):
+    """Stops a worker once its supervisor is gone (even if it was SIGKILLed), so no orphan keeps the port."""
+    while os.getppid() == supervisor_pid:
+        await asyncio.sleep(1)
+    log.warning("Supervisor %d exited; stopping worker %d", supervisor_pid, os.getpid())
+    server.close()
+
+async def run_server(supervisor_pid=None):
+    # A single event loop multiplexes every client connection; each one is
+    # served by its own handle_client_connection task instead of a thread.
+    # The only threads are a fixed pool for blocking file reads.
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=FILE_IO_WORKERS, thread_name_prefix='FileIO'))
+    if hasattr(signal, 'SIGHUP'):
+        loop.add_signal_handler(signal.SIGHUP, resolve_static_path.cache_clear)
+    # Only supervised workers share the port; a lone server keeps the usual
+    # "address already in use" error if another instance is running
+    server = await asyncio.start_server(handle_client_connection, HOST, PORT, reuse_address=True,
+                                        reuse_port=supervisor_pid is not None)
+    print(f"Server listening on {HOST}:{PORT} (pid {os.getpid()})")
+    async with server:
+        if supervisor_pid is not None:
+            watcher = asyncio.create_task(exit_with_supervisor(server, supervisor_pid)) # Keep a reference so it isn't collected
+        try:
+            await server.serve_forever()
+        except asyncio.CancelledError:
+            pass # server.close() from exit_with_supervisor
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.environ.get('LOGLEVEL', 'WARNING'))
     if not os.path.exists(STATIC_FILES_DIR):
         os.makedirs(STATIC_FILES_DIR)
         print(f"Created static files directory: {STATIC_FILES_DIR}")
-    run_server()
\ No newline at end of file
+    if WORKERS > 1 and hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT'):
+        supervisor_pid = supervise_workers()
+        if supervisor_pid is not None: # Only workers serve
+            asyncio.run(run_server(supervisor_pid))
+    else:
+        asyncio.run(run_server()) # Single process
\ No newline at end of file
@@ -1,11 +1,24 @@
 # server.py
 
+import functools
+import logging
+import selectors
 import socket
 import os
+import signal
+import stat
+import time
 
 HOST = '127.0.0.1'
 PORT = 8080
 STATIC_FILES_DIR = 'static'
+STATIC_ROOT = os.path.realpath(STATIC_FILES_DIR)
+MAX_HEADER_SIZE = 8192 # Requests whose headers exceed this are rejected
+KEEP_ALIVE_TIMEOUT = 5 # Seconds an idle connection is held open between requests
+SENDFILE_MIN_SIZE = 16 * 1024 # Files this large are streamed with os.sendfile() instead of read into memory
+
+# Per-request logging is at DEBUG, so it costs nothing unless enabled (LOGLEVEL=DEBUG)
+log = logging.getLogger('httpd')
 
 # Define common HTTP status codes and their messages
 STATUS_CODES = {
@@ -15,111 +28,330 @@ STATUS_CODES = {
     500: "Internal Server Error"
 }
 
-# Helper to determine Content-Type based on file extension
+# Content-Type for each served file extension
+MIME_TYPES = {
+    '.html': 'text/html',
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.json': 'application/json',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.txt': 'text/plain'
+}
+
+# Header-ready bytes for each status message and content type
+_STATUS_BYTES = {code: message.encode('ascii') for code, message in STATUS_CODES.items()}
+_MIME_BYTES = {ext: mime_type.encode('ascii') for ext, mime_type in MIME_TYPES.items()}
+
+# Helper to determine Content-Type (as header bytes) based on file extension
 def get_content_type(file_path):
     _, ext = os.path.splitext(file_path)
-    if ext == '.html':
-        return 'text/html'
-    elif ext == '.css':
-        return 'text/css'
-    elif ext == '.js':
-        return 'application/javascript'
-    elif ext == '.json':
-        return 'application/json'
-    elif ext == '.png':
-        return 'image/png'
-    elif ext == '.jpg' or ext == '.jpeg':
-        return 'image/jpeg'
-    elif ext == '.gif':
-        return 'image/gif'
-    elif ext == '.txt':
-        return 'text/plain'
-    else:
-        return 'application/octet-stream' # Default for unknown types
+    return _MIME_BYTES.get(ext.lower(), b'application/octet-stream') # Default for unknown types
 
-def handle_request(conn):
+def is_within_static_root(file_path):
+    real_path = os.path.realpath(file_path)
+    return real_path == STATIC_ROOT or real_path.startswith(STATIC_ROOT + os.sep)
+
+# Request path -> (file_path, index_path): the file it names and the index.html
+# served if that turns out to be a directory. Either is None if it lies outside
+# STATIC_FILES_DIR (e.g. through a symlink). Only the path arithmetic and the
+# realpath checks are cached; whether a path exists or is a directory is
+# stat'ed per request. Symlink changes need a SIGHUP to clear the cache.
+@functools.lru_cache(maxsize=4096)
+def resolve_static_path(path):
+    file_path = os.path.join(STATIC_FILES_DIR, path.lstrip('/')) # Remove leading slash
+    index_path = os.path.join(file_path, 'index.html')
+    return (file_path if is_within_static_root(file_path) else None,
+            index_path if is_within_static_root(index_path) else None)
+
+def stat_or_none(file_path):
+    if file_path is None:
+        return None
     try:
-        request_data = conn.recv(4096).decode('utf-8')
-        if not request_data:
-            return
+        return os.stat(file_path)
+    except OSError:
+        return None
 
-        print(f"\n--- Raw Request ---\n{request_data}\n-------------------")
+def find_static_file(path):
+    """Returns (file_path, stat_result) for the regular file a request path serves, or (None, None).
+    A plain file costs one stat; a directory serves its index.html for a second one."""
+    file_path, index_path = resolve_static_path(path)
+    st = stat_or_none(file_path)
+    if st is not None and stat.S_ISDIR(st.st_mode): # If path is a directory, serve index.html within it
+        file_path, st = index_path, stat_or_none(index_path)
+    if st is None or not stat.S_ISREG(st.st_mode):
+        return None, None
+    return file_path, st
+
+def is_unsafe_path(path):
+    """Cheap rejection of traversal attempts before any filesystem access."""
+    return '..' in path or '\x00' in path or not path.startswith('/')
+
+def handle_request(request_data):
+    """Builds the response to one request's header bytes. Returns (response_bytes, keep_alive, body_file),
+    where body_file is None or an open (file, size) to send with os.sendfile() after response_bytes."""
+    try:
+        # Header bytes are ASCII; latin-1 decodes any byte without failing
+        request_headers = request_data.decode('latin-1')
+        log.debug("\n--- Raw Request ---\n%s\n-------------------", request_headers)
 
         # Basic HTTP Request Line Parsing
         # Example: GET /index.html HTTP/1.1
-        request_lines = request_data.split('\r\n')
+        request_lines = request_headers.split('\r\n')
         request_line = request_lines[0]
         parts = request_line.split(' ')
 
         if len(parts) != 3:
-            send_response(conn, 400, "Bad Request", "<h1>400 Bad Request</h1>")
-            return
+            return _RESP_400, False, None
 
         method, path, http_version = parts
 
-        print(f"Method: {method}, Path: {path}, HTTP Version: {http_version}")
+        log.debug("Method: %s, Path: %s, HTTP Version: %s", method, path, http_version)
+
+        # HTTP/1.1 connections persist unless the client sends 'Connection: close';
+        # HTTP/1.0 ones only on 'Connection: keep-alive'
+        connection = ''
+        for line in request_lines[1:]:
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'connection':
+                connection = value.strip().lower()
+        keep_alive = connection != 'close' if http_version == 'HTTP/1.1' else connection == 'keep-alive'
 
         # Handling static files
         if method == 'GET':
-            file_path = os.path.join(STATIC_FILES_DIR, path.lstrip('/')) # Remove leading slash
-            if os.path.isdir(file_path): # If path is a directory, serve index.html within it
-                file_path = os.path.join(file_path, 'index.html')
+            if is_unsafe_path(path):
+                return _RESP_400, False, None
 
-            if os.path.exists(file_path) and os.path.isfile(file_path):
+            file_path, st = find_static_file(path)
+            if st is not None:
                 try:
+                    content_type = get_content_type(file_path)
+                    if st.st_size >= SENDFILE_MIN_SIZE and hasattr(os, 'sendfile'):
+                        # Large files go from the page cache to the socket without passing through Python
+                        f = open(file_path, 'rb')
+                        size = os.fstat(f.fileno()).st_size
+                        return build_headers(200, content_type, size, keep_alive), keep_alive, (f, size)
                     with open(file_path, 'rb') as f: # Read in binary mode
                         content = f.read()
-                    content_type = get_content_type(file_path)
-                    send_response(conn, 200, "OK", content, content_type=content_type)
+                    return build_response(200, content, content_type, keep_alive), keep_alive, None
                 except Exception as e:
-                    print(f"Error reading file {file_path}: {e}")
-                    send_response(conn, 500, "Internal Server Error", "<h1>500 Internal Server Error</h1>")
+                    log.error("Error reading file %s: %s", file_path, e)
+                    return _RESP_500, False, None
             else:
-                send_response(conn, 404, "Not Found", "<h1>404 Not Found</h1>")
+                return _RESP_404, False, None
         else:
             # For now, only GET is supported for static files
-            send_response(conn, 400, "Bad Request", f"<h1>400 Bad Request: Method {method} not supported for static files.</h1>")
+            return build_response(400, f"<h1>400 Bad Request: Method {method} not supported for static files.</h1>"), False, None
 
     except Exception as e:
-        print(f"Error handling request: {e}")
-        send_response(conn, 500, "Internal Server Error", "<h1>500 Internal Server Error</h1>")
-
-def send_response(conn, status_code, status_message, body, content_type='text/html'):
-    # Prepare HTTP headers
-    headers = [
-        f"HTTP/1.1 {status_code} {status_message}",
-        f"Content-Type: {content_type}",
-        f"Content-Length: {len(body) if isinstance(body, bytes) else len(body.encode('utf-8'))}", # Handle bytes or string
-        "Connection: close", # Tell the client to close the connection after response
-        "\r\n" # CRLF to separate headers from body
-    ]
-    response_headers = "\r\n".join(headers).encode('utf-8')
-
-    # Send headers
-    conn.sendall(response_headers)
-
-    # Send body
-    if isinstance(body, str):
-        conn.sendall(body.encode('utf-8'))
-    elif isinstance(body, bytes):
-        conn.sendall(body)
+        log.error("Error handling request: %s", e)
+        return _RESP_500, False, None
+
+# Every response header block is this one template, filled in by a single bytes % format
+_HEADER_TEMPLATE = (
+    b"HTTP/1.1 %d %b\r\n"
+    b"Content-Type: %b\r\n"
+    b"Content-Length: %d\r\n"
+    b"Connection: %b\r\n" # Whether the client may send another request
+    b"\r\n" # CRLF to separate headers from body
+)
+
+def build_headers(status_code, content_type, content_length, keep_alive=False):
+    connection = b'keep-alive' if keep_alive else b'close'
+    return _HEADER_TEMPLATE % (status_code, _STATUS_BYTES[status_code], content_type, content_length, connection)
+
+def build_response(status_code, body, content_type=b'text/html', keep_alive=False):
+    """Serializes a complete HTTP response (headers and body) to bytes."""
+    body_bytes = body if isinstance(body, bytes) else body.encode('utf-8') # Handle bytes or string
+    return build_headers(status_code, content_type, len(body_bytes), keep_alive) + body_bytes
+
+# Error responses never change, so serialize them once at import time.
+# They all close the connection.
+_RESP_400 = build_response(400, "<h1>400 Bad Request</h1>")
+_RESP_404 = build_response(404, "<h1>404 Not Found</h1>")
+_RESP_500 = build_response(500, "<h1>500 Internal Server Error</h1>")
+
+# --- Event Loop ---
+# One thread serves every client: the listening socket and all connections are
+# non-blocking and registered with a selector (epoll/kqueue where available),
+# and each ready socket is serviced without ever waiting on another.
+# Per-connection state is a dict: { 'addr', 'inbuf', 'outbuf', 'outfile', 'closing', 'discard', 'last_active', 'events' }
+
+# Every recv lands in this one preallocated buffer (there is only one thread)
+# before being appended to the connection's inbuf, so no bytes object is
+# allocated per read.
+_RECV_BUFFER = bytearray(8192)
+_RECV_VIEW = memoryview(_RECV_BUFFER)
+
+def accept_connection(sel, s):
+    try:
+        conn, addr = s.accept()
+    except BlockingIOError:
+        return # Another wakeup already took it
+    conn.setblocking(False)
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # Don't hold small responses back (Nagle)
+    log.debug("Connected by %s", addr)
+    state = {
+        'addr': addr,
+        'inbuf': bytearray(),   # Received bytes not yet parsed into a request
+        'outbuf': bytearray(),  # Response bytes not yet accepted by the socket
+        'outfile': None,        # [file, offset, remaining] being sent with os.sendfile() after outbuf
+        'closing': False,       # Close once outbuf drains
+        'discard': 0,           # Body bytes of the last request still to be dropped
+        'last_active': time.monotonic(),
+        'events': selectors.EVENT_READ
+    }
+    sel.register(conn, selectors.EVENT_READ, state)
+
+def close_connection(sel, conn):
+    state = sel.get_key(conn).data
+    if state['outfile'] is not None:
+        state['outfile'][0].close()
+    sel.unregister(conn)
+    conn.close()
+    log.debug("Connection with %s closed.", state['addr'])
+
+def set_events(sel, conn, state, events):
+    if state['events'] != events: # Skip the syscall when nothing changes
+        sel.modify(conn, events, state)
+        state['events'] = events
+
+def request_body_length(request_data):
+    """Returns how many body bytes follow a request's headers, or None if the body isn't Content-Length framed."""
+    body_length = 0
+    for line in request_data.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'transfer-encoding':
+            return None # Chunked bodies aren't supported
+        if name == b'content-length':
+            value = value.strip()
+            if not value.isdigit():
+                return None
+            body_length = int(value)
+    return body_length
+
+def process_requests(state):
+    """Answers every complete request in inbuf (pipelining), queueing the responses in outbuf.
+    Stops after a response with a body_file; flush_output resumes once the file is sent."""
+    inbuf = state['inbuf']
+    while not state['closing'] and state['outfile'] is None:
+        # No route reads a body, but it must be skipped so it isn't parsed as the next request
+        if state['discard']:
+            skipped = min(len(inbuf), state['discard'])
+            del inbuf[:skipped]
+            state['discard'] -= skipped
+            if state['discard']:
+                return # Wait for the rest of the body
+
+        header_end = inbuf.find(b'\r\n\r\n')
+        if header_end == -1:
+            if len(inbuf) > MAX_HEADER_SIZE: # Headers too large
+                state['outbuf'] += _RESP_400
+                state['closing'] = True
+            return
+        request_data = bytes(inbuf[:header_end])
+        del inbuf[:header_end + 4]
+
+        body_length = request_body_length(request_data)
+        if body_length is None: # Can't tell where the next request starts
+            state['outbuf'] += _RESP_400
+            state['closing'] = True
+            return
+        state['discard'] = body_length
+
+        response, keep_alive, body_file = handle_request(request_data)
+        state['outbuf'] += response
+        state['closing'] = not keep_alive
+        if body_file is not None:
+            f, size = body_file
+            state['outfile'] = [f, 0, size]
+
+def flush_output(sel, conn, state):
+    """Sends as much of outbuf (then outfile) as the socket accepts, then picks the events to wait for next."""
+    while True:
+        if state['outbuf']:
+            try:
+                sent = conn.send(state['outbuf'])
+            except BlockingIOError:
+                break
+            del state['outbuf'][:sent]
+            state['last_active'] = time.monotonic()
+            if state['outbuf']:
+                break # Socket buffer is full
+        elif state['outfile'] is not None:
+            outfile = state['outfile']
+            f, offset, remaining = outfile
+            try:
+                sent = os.sendfile(conn.fileno(), f.fileno(), offset, remaining)
+            except BlockingIOError:
+                break
+            if sent == 0: # File shrank below the Content-Length already sent
+                raise OSError(f"file ended {remaining} bytes early")
+            outfile[1] += sent
+            outfile[2] -= sent
+            state['last_active'] = time.monotonic()
+            if not outfile[2]:
+                f.close()
+                state['outfile'] = None
+                process_requests(state) # Answer requests pipelined behind this one
+        else:
+            break
+
+    if state['outbuf'] or state['outfile'] is not None:
+        # Stop reading until the client catches up with its responses
+        set_events(sel, conn, state, selectors.EVENT_WRITE)
+    elif state['closing']:
+        close_connection(sel, conn)
+    else:
+        set_events(sel, conn, state, selectors.EVENT_READ)
+
+def service_connection(sel, conn, state, mask):
+    try:
+        if mask & selectors.EVENT_READ:
+            n = conn.recv_into(_RECV_BUFFER)
+            if not n:
+                close_connection(sel, conn) # Client disconnected
+                return
+            state['inbuf'] += _RECV_VIEW[:n]
+            state['last_active'] = time.monotonic()
+            process_requests(state)
+        flush_output(sel, conn, state)
+    except OSError as e: # Connection reset, broken pipe, ...
+        log.debug("Connection with %s failed: %s", state['addr'], e)
+        close_connection(sel, conn)
 
+def close_idle_connections(sel):
+    deadline = time.monotonic() - KEEP_ALIVE_TIMEOUT
+    idle = [key.fileobj for key in sel.get_map().values()
+            if key.data is not None and key.data['last_active'] < deadline]
+    for conn in idle:
+        close_connection(sel, conn)
 
 def run_server():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s, selectors.DefaultSelector() as sel:
         s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # Allows reusing the address quickly
         s.bind((HOST, PORT))
         print(f"Server listening on {HOST}:{PORT}")
-        s.listen(5)
+        s.listen(socket.SOMAXCONN)
+        s.setblocking(False)
+        sel.register(s, selectors.EVENT_READ, None) # No state marks the listening socket
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: resolve_static_path.cache_clear())
 
         while True:
-            conn, addr = s.accept()
-            with conn:
-                print(f"Connected by {addr}")
-                handle_request(conn) # Process the client request
-            print(f"Connection with {addr} closed.")
+            # Wake at least once a second so idle keep-alive connections get closed
+            for key, mask in sel.select(timeout=1):
+                if key.data is None:
+                    accept_connection(sel, key.fileobj)
+                else:
+                    service_connection(sel, key.fileobj, key.data, mask)
+            close_idle_connections(sel)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.environ.get('LOGLEVEL', 'WARNING'))
     if not os.path.exists(STATIC_FILES_DIR):
         os.makedirs(STATIC_FILES_DIR)
         print(f"Created static files directory: {STATIC_FILES_DIR}")